@@ -1,7 +1,9 @@
-import copy
+import bisect
+import functools
 import os
 import re
 from collections import abc
+from weakref import WeakKeyDictionary
 
 from .core import Argument
 from .core import MultiCommand
@@ -24,10 +26,8 @@ COMPLETION_SCRIPT_BASH = """
 
 %(complete_func)s_setup() {
     local COMPLETION_OPTIONS=""
-    local BASH_VERSION_ARR=(${BASH_VERSION//./ })
     # Only BASH version 4.4 and later have the nosort option.
-    if [ ${BASH_VERSION_ARR[0]} -gt 4 ] || ([ ${BASH_VERSION_ARR[0]} -eq 4 ] \
-&& [ ${BASH_VERSION_ARR[1]} -ge 4 ]); then
+    if (( BASH_VERSINFO[0] * 100 + BASH_VERSINFO[1] >= 404 )); then
         COMPLETION_OPTIONS="-o nosort"
     fi
 
@@ -88,6 +88,7 @@ _completion_scripts = {
 _invalid_ident_char_re = re.compile(r"[^a-zA-Z0-9_]")
 
 
+@functools.lru_cache(maxsize=32)
 def get_completion_script(prog_name, complete_var, shell):
     cf_name = _invalid_ident_char_re.sub("", prog_name.replace("-", "_"))
     script = _completion_scripts.get(shell, COMPLETION_SCRIPT_BASH)
@@ -110,7 +111,7 @@ def resolve_ctx(cli, prog_name, args):
     :param args: full list of args
     :return: the final context/command parsed
     """
-    ctx = cli.make_context(prog_name, args, resilient_parsing=True)
+    ctx = cli.make_context(prog_name, list(args), resilient_parsing=True)
     args = ctx.protected_args + ctx.args
     while args:
         if isinstance(ctx.command, MultiCommand):
@@ -164,18 +165,27 @@ def is_incomplete_option(all_args, cmd_param):
     """
     if not isinstance(cmd_param, Option):
         return False
-    if cmd_param.is_flag:
+    return _is_incomplete_option(all_args, cmd_param)
+
+
+def _is_incomplete_option(all_args, option):
+    """Like :func:`is_incomplete_option`, for a param already known to
+    be an :class:`Option`.
+    """
+    if option.is_flag:
         return False
     last_option = None
-    for index, arg_str in enumerate(
-        reversed([arg for arg in all_args if arg != WORDBREAK])
-    ):
-        if index + 1 > cmd_param.nargs:
+    count = 0
+    for arg_str in reversed(all_args):
+        if arg_str == WORDBREAK:
+            continue
+        if count >= option.nargs:
             break
+        count += 1
         if start_of_option(arg_str):
             last_option = arg_str
 
-    return True if last_option and last_option in cmd_param.opts else False
+    return bool(last_option) and last_option in option.opts
 
 
 def is_incomplete_argument(current_params, cmd_param):
@@ -189,20 +199,67 @@ def is_incomplete_argument(current_params, cmd_param):
     """
     if not isinstance(cmd_param, Argument):
         return False
-    current_param_values = current_params[cmd_param.name]
+    return _is_incomplete_argument(current_params, cmd_param)
+
+
+def _is_incomplete_argument(current_params, argument):
+    """Like :func:`is_incomplete_argument`, for a param already known
+    to be an :class:`Argument`.
+    """
+    current_param_values = current_params[argument.name]
     if current_param_values is None:
         return True
-    if cmd_param.nargs == -1:
+    if argument.nargs == -1:
         return True
     if (
         isinstance(current_param_values, abc.Iterable)
-        and cmd_param.nargs > 1
-        and len(current_param_values) < cmd_param.nargs
+        and argument.nargs > 1
+        and len(current_param_values) < argument.nargs
     ):
         return True
     return False
 
 
+# Maps a choice type to the choices tuple its index was built from, the
+# choices as sorted strings, and the position of each in the choices.
+_choice_indexes = WeakKeyDictionary()
+
+
+def _get_choice_index(choice_type):
+    choices = choice_type.choices
+    cached = _choice_indexes.get(choice_type)
+    if cached is None or cached[0] is not choices:
+        pairs = sorted((str(c), index) for index, c in enumerate(choices))
+        cached = _choice_indexes[choice_type] = (
+            choices,
+            [value for value, _ in pairs],
+            [index for _, index in pairs],
+        )
+    return cached[1], cached[2]
+
+
+def get_choices_starting_with(choice_type, starts_with):
+    """
+    :param choice_type: the :class:`Choice` type of the parameter
+    :param starts_with: string that choices must start with.
+    :return: the choices whose string value starts with starts_with, in
+        their original order.
+    """
+    choices = choice_type.choices
+    # A short list is faster to scan than to build and search an index for.
+    if len(choices) < 8:
+        return [c for c in choices if str(c).startswith(starts_with)]
+    values, positions = _get_choice_index(choice_type)
+    # The matching values form a contiguous range of the sorted values.
+    # Every value with the prefix sorts before the prefix followed by the
+    # highest code point, except those that continue past that code point.
+    start = bisect.bisect_left(values, starts_with)
+    end = bisect.bisect_right(values, starts_with + "\U0010ffff", start)
+    while end < len(values) and values[end].startswith(starts_with):
+        end += 1
+    return [choices[index] for index in sorted(positions[start:end])]
+
+
 def get_user_autocompletions(ctx, args, incomplete, cmd_param):
     """
     :param ctx: context associated with the parsed command
@@ -215,7 +272,7 @@ def get_user_autocompletions(ctx, args, incomplete, cmd_param):
     if isinstance(cmd_param.type, Choice):
         # Choices don't support descriptions.
         results = [
-            (c, None) for c in cmd_param.type.choices if str(c).startswith(incomplete)
+            (c, None) for c in get_choices_starting_with(cmd_param.type, incomplete)
         ]
     elif cmd_param.autocompletion is not None:
         dynamic_completions = cmd_param.autocompletion(
@@ -227,42 +284,149 @@ def get_user_autocompletions(ctx, args, incomplete, cmd_param):
     return results
 
 
+class _PrefixTrie:
+    """Index values by every prefix of their key. Each node stores the
+    values of all keys below it in insertion order, so looking up a
+    prefix only walks the characters of the prefix.
+    """
+
+    __slots__ = ("children", "values")
+
+    def __init__(self, items=()):
+        self.children = {}
+        self.values = []
+        for key, value in items:
+            self.insert(key, value)
+
+    def insert(self, key, value):
+        node = self
+        node.values.append(value)
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _PrefixTrie()
+            child.values.append(value)
+            node = child
+
+    def starts_with(self, prefix):
+        """
+        :param prefix: the prefix to look up
+        :return: the values of all keys that start with prefix, in the
+            order they were inserted. The list must not be modified.
+        """
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.values
+
+
 def get_visible_commands_starting_with(ctx, starts_with):
     """
     :param ctx: context associated with the parsed command
     :starts_with: string that visible commands must start with.
     :return: all visible (not hidden) commands that start with starts_with.
     """
+    # Commands can depend on the context, so only look up the ones whose
+    # names match, and don't keep them between requests.
     for c in ctx.command.list_commands(ctx):
         if c.startswith(starts_with):
             command = ctx.command.get_command(ctx, c)
-            if not command.hidden:
+            if command is not None and not command.hidden:
                 yield command
 
 
-def add_subcommand_completions(ctx, incomplete, completions_out):
-    # Add subcommand completions.
-    if isinstance(ctx.command, MultiCommand):
-        completions_out.extend(
-            [
-                (c.name, c.get_short_help_str())
-                for c in get_visible_commands_starting_with(ctx, incomplete)
-            ]
+class _CommandIndex:
+    """Completion data for the params declared on a command. It is built
+    once per command and reused until the params, or the names or
+    visibility of its options, change.
+    """
+
+    __slots__ = ("params", "options", "option_state", "arguments", "option_trie")
+
+    def __init__(self, params):
+        self.params = list(params)
+        self.options = [p for p in params if isinstance(p, Option)]
+        self.option_state = [
+            (p.hidden, list(p.opts), list(p.secondary_opts)) for p in self.options
+        ]
+        self.arguments = [p for p in params if isinstance(p, Argument)]
+        # (opt, option) pairs for the opts of the visible options.
+        self.option_trie = _PrefixTrie(
+            (opt, (opt, param))
+            for param in self.options
+            if not param.hidden
+            for opt in param.opts + param.secondary_opts
         )
 
-    # Walk up the context list and add any other completion
-    # possibilities from chained commands
-    while ctx.parent is not None:
-        ctx = ctx.parent
-        if isinstance(ctx.command, MultiCommand) and ctx.command.chain:
-            remaining_commands = [
-                c
-                for c in get_visible_commands_starting_with(ctx, incomplete)
-                if c.name not in ctx.protected_args
-            ]
+    def is_current(self, params):
+        """Whether the index still matches the given declared params."""
+        return self.params == params and self.option_state == [
+            (p.hidden, p.opts, p.secondary_opts) for p in self.options
+        ]
+
+
+_empty_command_index = _CommandIndex(())
+# Maps a command to the index of its declared params.
+_command_indexes = WeakKeyDictionary()
+
+
+def _get_command_index(ctx, params):
+    """
+    :param ctx: context associated with the parsed command
+    :param params: the params of the command, from get_params
+    :return: the index of the params declared on the command, and a
+        list of the other params get_params returned for this context,
+        such as the help option.
+    """
+    command = ctx.command
+    declared = command.params
+    count = len(declared)
+    if params[:count] != declared:
+        return _empty_command_index, params
+    index = _command_indexes.get(command)
+    if index is None or not index.is_current(declared):
+        index = _command_indexes[command] = _CommandIndex(declared)
+    return index, params[count:]
+
+
+def get_visible_opts_starting_with(index, extra_params, starts_with):
+    """
+    :param index: the index of the params declared on the command, from
+        :func:`_get_command_index`
+    :param extra_params: the other params of the command for this context
+    :param starts_with: string that option names must start with.
+    :return: (opt, option) pairs for all visible (not hidden) options
+        with an opt that starts with starts_with, in declaration order.
+    """
+    yield from index.option_trie.starts_with(starts_with)
+    # Params that are created per context are checked individually.
+    for param in extra_params:
+        if isinstance(param, Option) and not param.hidden:
+            for opt in param.opts + param.secondary_opts:
+                if opt.startswith(starts_with):
+                    yield opt, param
+
+
+def add_subcommand_completions(ctx, incomplete, completions_out):
+    # Add subcommand completions, then walk up the context list and add
+    # any other completion possibilities from chained commands.
+    is_parent = False
+    while ctx is not None:
+        command = ctx.command
+        if isinstance(command, MultiCommand) and (command.chain or not is_parent):
+            # A parent chain can't repeat the commands it already ran.
+            used = frozenset(ctx.protected_args) if is_parent else ()
             completions_out.extend(
-                [(c.name, c.get_short_help_str()) for c in remaining_commands]
+                [
+                    (c.name, c.get_short_help_str())
+                    for c in get_visible_commands_starting_with(ctx, incomplete)
+                    if c.name not in used
+                ]
             )
+        ctx = ctx.parent
+        is_parent = True
 
 
 def get_choices(cli, prog_name, args, incomplete):
@@ -273,7 +437,7 @@ def get_choices(cli, prog_name, args, incomplete):
     :param incomplete: the incomplete text to autocomplete
     :return: all the possible completions for the incomplete
     """
-    all_args = copy.deepcopy(args)
+    all_args = list(args)
 
     ctx = resolve_ctx(cli, prog_name, args)
     if ctx is None:
@@ -283,34 +447,39 @@ def get_choices(cli, prog_name, args, incomplete):
 
     # In newer versions of bash long opts with '='s are partitioned, but
     # it's easier to parse without the '='
-    if start_of_option(incomplete) and WORDBREAK in incomplete:
-        partition_incomplete = incomplete.partition(WORDBREAK)
-        all_args.append(partition_incomplete[0])
-        incomplete = partition_incomplete[2]
+    is_option = start_of_option(incomplete)
+    if is_option:
+        # The first character is "-", so the search can start after it.
+        index = incomplete.find(WORDBREAK, 1)
+        if index != -1:
+            all_args.append(incomplete[:index])
+            incomplete = incomplete[index + 1 :]
+            is_option = start_of_option(incomplete)
     elif incomplete == WORDBREAK:
         incomplete = ""
 
+    params = ctx.command.get_params(ctx)
+    index, extra_params = _get_command_index(ctx, params)
+    options = index.options + [p for p in extra_params if isinstance(p, Option)]
+    arguments = index.arguments + [p for p in extra_params if isinstance(p, Argument)]
+
     completions = []
-    if not has_double_dash and start_of_option(incomplete):
+    if is_option and not has_double_dash:
         # completions for partial options
-        for param in ctx.command.get_params(ctx):
-            if isinstance(param, Option) and not param.hidden:
-                param_opts = [
-                    param_opt
-                    for param_opt in param.opts + param.secondary_opts
-                    if param_opt not in all_args or param.multiple
-                ]
-                completions.extend(
-                    [(o, param.help) for o in param_opts if o.startswith(incomplete)]
-                )
+        args_set = frozenset(all_args)
+        for opt, param in get_visible_opts_starting_with(
+            index, extra_params, incomplete
+        ):
+            if opt not in args_set or param.multiple:
+                completions.append((opt, param.help))
         return completions
     # completion for option values from user supplied values
-    for param in ctx.command.get_params(ctx):
-        if is_incomplete_option(all_args, param):
+    for param in options:
+        if _is_incomplete_option(all_args, param):
             return get_user_autocompletions(ctx, all_args, incomplete, param)
     # completion for argument values from user supplied values
-    for param in ctx.command.get_params(ctx):
-        if is_incomplete_argument(ctx.params, param):
+    for param in arguments:
+        if _is_incomplete_argument(ctx.params, param):
             return get_user_autocompletions(ctx, all_args, incomplete, param)
 
     add_subcommand_completions(ctx, incomplete, completions)
@@ -318,8 +487,34 @@ def get_choices(cli, prog_name, args, incomplete):
     return sorted(completions)
 
 
+def _split_comp_words(string):
+    """Split the completion words from the shell. Words without quotes
+    split the same way as with :func:`split_arg_string`, so that is only
+    used if a quote is present.
+    """
+    if "'" not in string and '"' not in string:
+        return string.split()
+    return split_arg_string(string)
+
+
+def _echo_lines(lines):
+    """Echo the completion lines with a single write. Values are converted
+    the way :func:`echo` converts them, so bytes are written as they are,
+    one line at a time, and other objects are converted with ``str``.
+    """
+    lines = [
+        line if isinstance(line, (str, bytes, bytearray)) else str(line)
+        for line in lines
+    ]
+    if any(not isinstance(line, str) for line in lines):
+        for line in lines:
+            echo(line)
+    elif lines:
+        echo("\n".join(lines))
+
+
 def do_complete(cli, prog_name, include_descriptions):
-    cwords = split_arg_string(os.environ["COMP_WORDS"])
+    cwords = _split_comp_words(os.environ["COMP_WORDS"])
     cword = int(os.environ["COMP_CWORD"])
     args = cwords[1:cword]
     try:
@@ -327,45 +522,57 @@ def do_complete(cli, prog_name, include_descriptions):
     except IndexError:
         incomplete = ""
 
-    for item in get_choices(cli, prog_name, args, incomplete):
-        echo(item[0])
+    lines = []
+    for value, description in get_choices(cli, prog_name, args, incomplete):
+        lines.append(value)
         if include_descriptions:
             # ZSH has trouble dealing with empty array parameters when
             # returned from commands, use '_' to indicate no description
             # is present.
-            echo(item[1] if item[1] else "_")
+            lines.append(description if description else "_")
 
+    _echo_lines(lines)
     return True
 
 
 def do_complete_fish(cli, prog_name):
-    cwords = split_arg_string(os.environ["COMP_WORDS"])
+    cwords = _split_comp_words(os.environ["COMP_WORDS"])
     incomplete = os.environ["COMP_CWORD"]
     args = cwords[1:]
 
-    for item in get_choices(cli, prog_name, args, incomplete):
-        if item[1]:
-            echo(f"{item[0]}\t{item[1]}")
+    lines = []
+    for value, description in get_choices(cli, prog_name, args, incomplete):
+        if description:
+            lines.append(f"{value}\t{description}")
         else:
-            echo(item[0])
+            lines.append(value)
 
+    _echo_lines(lines)
     return True
 
 
-def bashcomplete(cli, prog_name, complete_var, complete_instr):
-    if "_" in complete_instr:
-        command, shell = complete_instr.split("_", 1)
-    else:
-        command = complete_instr
-        shell = "bash"
+def _source(cli, prog_name, complete_var, shell):
+    echo(get_completion_script(prog_name, complete_var, shell))
+    return True
 
-    if command == "source":
-        echo(get_completion_script(prog_name, complete_var, shell))
-        return True
-    elif command == "complete":
-        if shell == "fish":
-            return do_complete_fish(cli, prog_name)
-        elif shell in {"bash", "zsh"}:
-            return do_complete(cli, prog_name, shell == "zsh")
 
+def _complete(cli, prog_name, complete_var, shell):
+    if shell == "fish":
+        return do_complete_fish(cli, prog_name)
+    elif shell in {"bash", "zsh"}:
+        return do_complete(cli, prog_name, shell == "zsh")
     return False
+
+
+_complete_instr_handlers = {"source": _source, "complete": _complete}
+
+
+def bashcomplete(cli, prog_name, complete_var, complete_instr):
+    command, sep, shell = complete_instr.partition("_")
+    if not sep:
+        shell = "bash"
+
+    handler = _complete_instr_handlers.get(command)
+    if handler is None:
+        return False
+    return handler(cli, prog_name, complete_var, shell)
@@ -927,6 +927,9 @@ class Command(BaseCommand):
         self.no_args_is_help = no_args_is_help
         self.hidden = hidden
         self.deprecated = deprecated
+        # The help option names used by get_help_option, and the help
+        # option it created with them.
+        self._help_option = None
 
     def __repr__(self):
         return f"<{self.__class__.__name__} {self.name}>"
@@ -973,17 +976,22 @@ class Command(BaseCommand):
         return all_names
 
     def get_help_option(self, ctx):
-        """Returns the help option object."""
+        """Returns the help option object. The same object is returned
+        as long as the help option names don't change.
+        """
         help_options = self.get_help_option_names(ctx)
         if not help_options or not self.add_help_option:
             return
 
+        if self._help_option is not None and self._help_option[0] == help_options:
+            return self._help_option[1]
+
         def show_help(ctx, param, value):
             if value and not ctx.resilient_parsing:
                 echo(ctx.get_help(), color=ctx.color)
                 ctx.exit()
 
-        return Option(
+        option = Option(
             help_options,
             is_flag=True,
             is_eager=True,
@@ -991,6 +999,8 @@ class Command(BaseCommand):
             callback=show_help,
             help="Show this message and exit.",
         )
+        self._help_option = (help_options, option)
+        return option
 
     def make_parser(self, ctx):
         """Creates the underlying option parser for this command."""
@@ -137,8 +137,8 @@ class Choice(ParamType):
     """The choice type allows a value to be checked against a fixed set
     of supported values. All of these values have to be strings.
 
-    You should only pass a list or tuple of choices. Other iterables
-    (like generators) may lead to surprising results.
+    Any iterable of choices can be passed, including generators. The
+    choices are copied into a tuple when the type is created.
 
     The resulting value will always be one of the originally passed choices
     regardless of ``case_sensitive`` or any ``ctx.token_normalize_func``
@@ -148,12 +148,16 @@ class Choice(ParamType):
 
     :param case_sensitive: Set to false to make choices case
         insensitive. Defaults to true.
+
+    .. versionchanged:: 8.0
+        ``choices`` is stored as a tuple, so it can't be modified in
+        place.
     """
 
     name = "choice"
 
     def __init__(self, choices, case_sensitive=True):
-        self.choices = choices
+        self.choices = tuple(choices)
         self.case_sensitive = case_sensitive
 
     def get_metavar(self, param):
@@ -1,7 +1,11 @@
 import pytest
 
 import click
+from click._bashcomplete import _split_comp_words
+from click._bashcomplete import add_subcommand_completions
+from click._bashcomplete import bashcomplete
 from click._bashcomplete import get_choices
+from click.parser import split_arg_string
 
 
 def choices_without_help(cli, args, incomplete):
@@ -32,6 +36,17 @@ def test_boolean_flag():
     assert choices_without_help(cli, [], "-") == ["--shout", "--no-shout", "--help"]
 
 
+def test_option_added_after_completion():
+    @click.command()
+    @click.option("--local-opt")
+    def cli(local_opt):
+        pass
+
+    assert choices_without_help(cli, [], "--l") == ["--local-opt"]
+    cli.params.append(click.Option(["--later-opt"]))
+    assert choices_without_help(cli, [], "--l") == ["--local-opt", "--later-opt"]
+
+
 def test_multi_value_option():
     @click.group()
     @click.option("--pos", nargs=2, type=float)
@@ -56,6 +71,9 @@ def test_multi_option():
         pass
 
     assert choices_without_help(cli, [], "-") == ["--message", "-m", "--help"]
+    assert choices_without_help(cli, [], "--") == ["--message", "--help"]
+    assert choices_without_help(cli, [], "-m") == ["-m"]
+    assert choices_without_help(cli, [], "-x") == []
     assert choices_without_help(cli, ["-m"], "") == []
 
 
@@ -95,14 +113,10 @@ def test_long_chain():
     COLORS = ["red", "green", "blue"]
 
     def get_colors(ctx, args, incomplete):
-        for c in COLORS:
-            if c.startswith(incomplete):
-                yield c
+        return [c for c in COLORS if c.startswith(incomplete)]
 
     def search_colors(ctx, args, incomplete):
-        for c in COLORS:
-            if incomplete in c:
-                yield c
+        return [c for c in COLORS if incomplete in c]
 
     CSUB_OPT_CHOICES = ["foo", "bar"]
     CSUB_CHOICES = ["bar", "baz"]
@@ -264,6 +278,50 @@ def test_option_choice():
     ]
 
 
+def test_option_changed_after_completion():
+    @click.command()
+    @click.option("--secret")
+    @click.option("--shown")
+    def cli(secret, shown):
+        pass
+
+    assert choices_without_help(cli, [], "--s") == ["--secret", "--shown"]
+    cli.params[0].hidden = True
+    assert choices_without_help(cli, [], "--s") == ["--shown"]
+    cli.params[1].opts.append("--shown-too")
+    assert choices_without_help(cli, [], "--s") == ["--shown", "--shown-too"]
+
+
+@pytest.mark.parametrize("extra", [[], ["d1", "d2", "d3", "e"]])
+def test_choice_prefix_keeps_order(extra):
+    choices = ["b2", "a", "b1", "ab", "c", "b"] + extra
+
+    @click.command()
+    @click.option("--opt", type=click.Choice(choices))
+    def cli(opt):
+        pass
+
+    assert choices_without_help(cli, ["--opt"], "") == choices
+    assert choices_without_help(cli, ["--opt"], "b") == ["b2", "b1", "b"]
+    assert choices_without_help(cli, ["--opt"], "a") == ["a", "ab"]
+    assert choices_without_help(cli, ["--opt"], "ab") == ["ab"]
+    assert choices_without_help(cli, ["--opt"], "f") == []
+
+
+def test_choice_prefix_max_code_point():
+    top = "\U0010ffff"
+    choices = ["a", f"a{top}", f"a{top}{top}", f"a{top}b", "b", "c", "d", "e"]
+
+    @click.command()
+    @click.option("--opt", type=click.Choice(choices))
+    def cli(opt):
+        pass
+
+    assert choices_without_help(cli, ["--opt"], f"a{top}") == choices[1:4]
+    assert choices_without_help(cli, ["--opt"], f"a{top}{top}") == [choices[2]]
+    assert choices_without_help(cli, ["--opt"], "a") == choices[:4]
+
+
 def test_option_and_arg_choice():
     @click.command()
     @click.option("--opt1", type=click.Choice(["opt11", "opt12"]))
@@ -458,6 +516,142 @@ def test_chained_multi():
     assert choices_without_help(cli, ["sub", "csub", "dsub"], "") == ["esub"]
 
 
+def test_envvar_read_per_completion(monkeypatch):
+    @click.command()
+    @click.argument("a", envvar="A_ENV", type=click.Choice(["x", "y"]))
+    def cli(a):
+        pass
+
+    assert choices_without_help(cli, [], "") == ["x", "y"]
+    monkeypatch.setenv("A_ENV", "x")
+    assert choices_without_help(cli, [], "") == []
+
+
+def test_subcommands_depend_on_context():
+    class AdminGroup(click.MultiCommand):
+        def list_commands(self, ctx):
+            return ["admin", "apply"]
+
+        def get_command(self, ctx, name):
+            hidden = name == "admin" and not ctx.obj["is_admin"]
+            return click.Command(name, hidden=hidden)
+
+    cli = AdminGroup()
+
+    def choices_for(is_admin):
+        ctx = cli.make_context(
+            "dummy", [], obj={"is_admin": is_admin}, resilient_parsing=True
+        )
+        completions = []
+        add_subcommand_completions(ctx, "a", completions)
+        return [c[0] for c in completions]
+
+    assert choices_for(False) == ["apply"]
+    assert choices_for(True) == ["admin", "apply"]
+    assert choices_for(False) == ["apply"]
+
+
+def test_subcommand_help_changed_after_completion():
+    @click.group()
+    def cli():
+        pass
+
+    @cli.command(help="old")
+    def sub():
+        pass
+
+    assert choices_with_help(cli, [], "") == [("sub", "old")]
+    sub.help = "new"
+    assert choices_with_help(cli, [], "") == [("sub", "new")]
+
+
+def test_args_not_modified():
+    @click.command()
+    @click.option("--opt")
+    def cli(opt):
+        pass
+
+    args = ["--opt"]
+    assert choices_without_help(cli, args, "--opt=") == []
+    assert args == ["--opt"]
+
+
+@pytest.fixture(scope="module")
+def output_cli():
+    @click.group()
+    def cli():
+        pass
+
+    @cli.command()
+    def asub():
+        pass
+
+    @cli.command(help="bsub help")
+    def bsub():
+        pass
+
+    return cli
+
+
+@pytest.mark.parametrize(
+    ("instr", "comp_words", "comp_cword", "expect"),
+    [
+        ("complete", "cli ", "1", "asub\nbsub\n"),
+        ("complete_zsh", "cli ", "1", "asub\n_\nbsub\nbsub help\n"),
+        ("complete_fish", "cli ", "", "asub\nbsub\tbsub help\n"),
+        ("complete", "cli x", "1", ""),
+    ],
+)
+def test_complete_output(
+    monkeypatch, capsys, output_cli, instr, comp_words, comp_cword, expect
+):
+    monkeypatch.setenv("COMP_WORDS", comp_words)
+    monkeypatch.setenv("COMP_CWORD", comp_cword)
+    assert bashcomplete(output_cli, "cli", "_CLI_COMPLETE", instr)
+    assert capsys.readouterr().out == expect
+
+
+@pytest.mark.parametrize(
+    ("instr", "expect"),
+    [
+        ("complete", "a\nb\n"),
+        ("complete_zsh", "a\n1\nb\n_\n"),
+        ("complete_fish", "a\t1\nb\n"),
+    ],
+)
+def test_complete_output_not_str(monkeypatch, capsys, instr, expect):
+    @click.command()
+    @click.argument(
+        "arg", autocompletion=lambda ctx, args, incomplete: [("a", 1), b"b"]
+    )
+    def cli(arg):
+        pass
+
+    monkeypatch.setenv("COMP_WORDS", "cli ")
+    monkeypatch.setenv("COMP_CWORD", "" if instr == "complete_fish" else "1")
+    assert bashcomplete(cli, "cli", "_CLI_COMPLETE", instr)
+    assert capsys.readouterr().out == expect
+
+
+def test_subcommand_added_after_completion():
+    @click.group()
+    def cli():
+        pass
+
+    @cli.command()
+    def alpha():
+        pass
+
+    assert choices_without_help(cli, [], "a") == ["alpha"]
+
+    @cli.command()
+    def another():
+        pass
+
+    assert choices_without_help(cli, [], "a") == ["alpha", "another"]
+    assert choices_without_help(cli, [], "an") == ["another"]
+
+
 def test_hidden():
     @click.group()
     @click.option("--name", hidden=True)
@@ -486,6 +680,7 @@ def test_hidden():
     assert choices_without_help(cli, [], "--c") == []
     # If the user exactly types out the hidden param, complete its options.
     assert choices_without_help(cli, ["--choices"], "") == [1, 2]
+    assert choices_without_help(cli, ["--choices"], "2") == [2]
     assert choices_without_help(cli, [], "") == ["asub"]
     assert choices_without_help(cli, [], "") == ["asub"]
     assert choices_without_help(cli, [], "h") == []
@@ -494,18 +689,8 @@ def test_hidden():
     assert choices_without_help(cli, ["hsub"], "--h") == ["--hname", "--help"]
 
 
-@pytest.mark.parametrize(
-    ("args", "part", "expect"),
-    [
-        ([], "-", ["--opt", "--help"]),
-        (["value"], "--", ["--opt", "--help"]),
-        ([], "-o", []),
-        (["--opt"], "-o", []),
-        (["--"], "", ["name", "-o", "--opt", "--"]),
-        (["--"], "--o", ["--opt"]),
-    ],
-)
-def test_args_with_double_dash_complete(args, part, expect):
+@pytest.fixture(scope="module")
+def double_dash_cli():
     def _complete(ctx, args, incomplete):
         values = ["name", "-o", "--opt", "--"]
         return [x for x in values if x.startswith(incomplete)]
@@ -516,4 +701,34 @@ def test_args_with_double_dash_complete(args, part, expect):
     def cli(opt, args):
         pass
 
-    assert choices_without_help(cli, args, part) == expect
+    return cli
+
+
+@pytest.mark.parametrize(
+    ("args", "part", "expect"),
+    (
+        ((), "-", ["--opt", "--help"]),
+        (("value",), "--", ["--opt", "--help"]),
+        ((), "-o", []),
+        (("--opt",), "-o", []),
+        (("--",), "", ["name", "-o", "--opt", "--"]),
+        (("--",), "--o", ["--opt"]),
+    ),
+)
+def test_args_with_double_dash_complete(double_dash_cli, args, part, expect):
+    assert choices_without_help(double_dash_cli, args, part) == expect
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "",
+        "cli sub --opt",
+        "  cli\tsub  --opt=a\\b ",
+        "cli 'sub arg' --opt",
+        'cli "sub" --opt',
+        "cli 'sub",
+    ],
+)
+def test_split_comp_words(value):
+    assert _split_comp_words(value) == split_arg_string(value)
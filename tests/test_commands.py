@@ -81,6 +81,19 @@ def test_no_args_is_help(runner):
     assert "Show this message and exit." in result.output
 
 
+def test_help_option_reused():
+    @click.command()
+    def cli():
+        pass
+
+    ctx = click.Context(cli)
+    option = cli.get_help_option(ctx)
+    assert option.opts == ["--help"]
+    assert cli.get_help_option(ctx) is option
+    ctx = click.Context(cli, help_option_names=["-h"])
+    assert cli.get_help_option(ctx).opts == ["-h"]
+
+
 def test_default_maps(runner):
     @click.group()
     def cli():
@@ -314,3 +327,21 @@ def test_deprecated_in_invocation(runner):
 
     result = runner.invoke(deprecated_cmd)
     assert "DeprecationWarning:" in result.output
+
+
+def test_str_subclass_names(runner):
+    class Name(str):
+        pass
+
+    @click.group()
+    def cli():
+        pass
+
+    @cli.command(Name("sub"))
+    @click.option(Name("--value"))
+    def sub(value):
+        click.echo(value)
+
+    result = runner.invoke(cli, ["sub", "--value", "1"])
+    assert not result.exception
+    assert result.output == "1\n"
@@ -21,6 +21,18 @@ def test_zsh_func_name():
     assert "(( ! $+commands[foo-bar] )) && return 1" in script
 
 
+def test_fish_func_name():
+    from click._bashcomplete import get_completion_script
+
+    script = get_completion_script("foo-bar", "_COMPLETE_VAR", "fish")
+    assert script == (
+        "complete --no-files --command foo-bar --arguments"
+        ' "(env _COMPLETE_VAR=complete_fish'
+        " COMP_WORDS=(commandline -cp) COMP_CWORD=(commandline -t)"
+        ' foo-bar)";'
+    )
+
+
 @pytest.mark.xfail(WIN, reason="Jupyter not tested/supported on Windows")
 def test_is_jupyter_kernel_output():
     class JupyterKernelFakeStream: